@@ -9,10 +9,18 @@
 import os
 import sys
 import math
-import random
 import numpy as np
 import networkx as nx
-from scipy.special import gamma, loggamma
+from scipy.special import gammaln
+try:
+    from numba import njit
+except ImportError:
+    # Numba is optional: without it the simulation kernel below still
+    # runs as plain (slower) Python.
+    def njit(*args,**kwargs):
+        if len(args)==1 and callable(args[0]):
+            return args[0]
+        return lambda f: f
 
 
 
@@ -33,6 +41,10 @@ retics          = 10
 local           = None
 # output type: pl=parent list, el=edge list, nw=newick (not implemented)
 out_type        = "el"
+# Number of independent networks to generate (in parallel if >1)
+n_networks      = 1
+# Seed for the random number generator; None picks a fresh one
+seed            = None
 
 
 option_help = False
@@ -51,6 +63,12 @@ while i < len(sys.argv):
     if arg == "-l" or arg == "--local":
         i+=1
         local = float(sys.argv[i])
+    if arg == "-j" or arg == "--number_of_networks":
+        i+=1
+        n_networks = int(sys.argv[i])
+    if arg == "-s" or arg == "--seed":
+        i+=1
+        seed = int(sys.argv[i])
     if arg == "-pl" or arg == "--parent_list":
         out_type = "pl"
     if arg == "-el" or arg == "--edge_list":
@@ -61,66 +79,412 @@ while i < len(sys.argv):
 
 
 if option_help:
-    print("Generates a tree under the beta-splitting model (Aldous 1996) and then adds edges to generate a network. The edges are added one by one, by randomly choosing two edges in the network and attaching a new edge between them. The two edges can be randomly chosen in two ways: uniformly at random [Default]; or by chosing one edge uniformly at random and then performing a random walk to find a second edge. The second option has a parameter `stop_prob' that determines the length of the random walk: after each step of the walk, the walk stops with probability `stop_prob. Hence, the higher this parameter, the more local the extra reticulation edges become.\n\nOptional arguments:\n -n or --number_of_tips followed by an int [Default=100] to set the number of tips of the network.\n -b or --beta followed by a float [Default=0.0] to set the beta parameter of the tree generating beta-splitting model.\n -r or --reticulations followed by an int [Default=10] to set the number of reticulations (i.e., extra edges).\n -l or --local followed by a float to use the local edge adding method. The float is the stop probability for the random walk.\n -pl or --parent_list to get output as a parent list.\n -el or --edge_list to get output as an edge list.")
+    print("Generates a tree under the beta-splitting model (Aldous 1996) and then adds edges to generate a network. The edges are added one by one, by randomly choosing two edges in the network and attaching a new edge between them. The two edges can be randomly chosen in two ways: uniformly at random [Default]; or by chosing one edge uniformly at random and then performing a random walk to find a second edge. The second option has a parameter `stop_prob' that determines the length of the random walk: after each step of the walk, the walk stops with probability `stop_prob. Hence, the higher this parameter, the more local the extra reticulation edges become.\n\nOptional arguments:\n -n or --number_of_tips followed by an int [Default=100] to set the number of tips of the network.\n -b or --beta followed by a float [Default=0.0] to set the beta parameter of the tree generating beta-splitting model.\n -r or --reticulations followed by an int [Default=10] to set the number of reticulations (i.e., extra edges).\n -l or --local followed by a float to use the local edge adding method. The float is the stop probability for the random walk.\n -j or --number_of_networks followed by an int [Default=1] to generate this many independent networks, in parallel over all cores (requires joblib). The networks are printed separated by an empty line.\n -s or --seed followed by an int to seed the random number generator, making the run reproducible.\n -pl or --parent_list to get output as a parent list.\n -el or --edge_list to get output as an edge list.")
     sys.exit()
 
 
 
 
 
+############################################
+# Random number generator
+############################################
+# One PCG64 generator for everything, including the jitted kernel;
+# seeding it makes a whole run reproducible.
+rng = np.random.default_rng(seed)
+
+
+
+
+############################################
+# Precomputed tables
+############################################
+# Log-gamma values used by computeProb for every internal node:
+#  LG_beta[k] = loggamma(beta+k+1) and LG_fact[k] = loggamma(k+1)
+# for k=0..tree_size+1. Computing them once here replaces the
+# O(tree_size^2) loggamma evaluations over a whole tree by O(tree_size).
+LG_beta = gammaln(beta + 1 + np.arange(tree_size+2))
+LG_fact = gammaln(1 + np.arange(tree_size+2))
+
+
+
+
 ############################################
 # Simulation functions
 ############################################
 
-# a_n is a normalizing constant defined in 
-# Equation (2) of Aldous1996 (so the sum of 
-# the values is equal to 1. It is not 
-# computed here to save time.
-def a_n(beta):
-    return 1
-
-# Compute the "probability" to split n in (i|n-1), where i=1,..,n-1
-def computeProb(n,beta):
-    q_n = []
-    for i in range(1,n):
-        q_i_n = np.exp((loggamma(beta+i+1)+loggamma(beta+n-i+1))-((a_n(beta)+loggamma(i+1)+loggamma(n-i+1))))
-        q_n.append(q_i_n)
-    return q_n
+# Build a Walker/Vose alias table for the m unnormalized weights in
+# w[:m] with sum total. Afterwards a draw takes O(1): pick a column j
+# uniformly, return j with probability prob[j] and alias[j] otherwise.
+# All buffers are preallocated by the caller.
+@njit(cache=True,nogil=True,fastmath=True)
+def _buildAliasTable(w, m, total, prob, alias, small, large):
+    scale = m/total
+    n_small = 0
+    n_large = 0
+    for i in range(m):
+        alias[i] = i
+        prob[i]  = w[i]*scale
+        if prob[i] < 1.0:
+            small[n_small] = i
+            n_small += 1
+        else:
+            large[n_large] = i
+            n_large += 1
+    while n_small > 0 and n_large > 0:
+        n_small -= 1
+        s = small[n_small]
+        l = large[n_large-1]
+        alias[s] = l
+        prob[l]  = (prob[l]+prob[s])-1.0
+        if prob[l] < 1.0:
+            n_large -= 1
+            small[n_small] = l
+            n_small += 1
+    #leftovers are 1 up to rounding
+    for i in range(n_large):
+        prob[large[i]] = 1.0
+    for i in range(n_small):
+        prob[small[i]] = 1.0
+
+
+# The simulation kernel: compiled with numba, so it works on plain int
+# arrays instead of a DiGraph. Leaves get the ids 1..n, internal nodes
+# get the ids n+1 (the root) and up, as before. On return the parents
+# buffer maps every node id to its parent (0 for the root).
+# For each internal node the split is sampled by computing the
+# log-weights for all splits (i|n-i) from the precomputed tables,
+# shifting by their maximum, and drawing from an alias table.
+# special selects a closed form for the weights: 1 for beta=0 (all
+# splits equally likely, drawn directly) and 2 for beta=-1 (weights
+# 1/(i*(n-i))); 0 uses the log-gamma tables.
+@njit(cache=True,nogil=True,fastmath=True)
+def _simulateSplits(n, LG_beta, LG_fact, special, rng, parents, sizes, queue, scratch, prob, alias, small, large):
+    # The work buffers are owned by the caller and reused across trees;
+    # only the parts this tree uses need resetting.
+    for v in range(2*n+2):
+        parents[v] = 0
+        sizes[v]   = 0
+    sizes[n+1]          = n
+    queue[0]            = n+1
+    top                 = 1
+    last_internal_node  = n+1
+    last_leaf_node      = 0
+    while top > 0:
+        top   -= 1
+        node   = queue[top]
+        n_node = sizes[node]
+        # Leaves do not split again.
+        if n_node <= 1:
+            continue
+        m      = n_node-1
+        if special==1:
+            # beta=0: all splits are equally likely
+            split = 1+int(rng.random()*m)
+        elif special==2:
+            # beta=-1: closed-form weights 1/(i*(n_node-i)), symmetric
+            # in i <-> n_node-i, so only the lower half is computed and
+            # mirrored; draw via an alias table
+            for i in range(1,n_node//2+1):
+                w = 1.0/(i*(n_node-i))
+                scratch[i-1] = w
+                scratch[m-i] = w
+            total = 0.0
+            for i in range(m):
+                total += scratch[i]
+            _buildAliasTable(scratch, m, total, prob, alias, small, large)
+            j = int(rng.random()*m)
+            if rng.random() >= prob[j]:
+                j = alias[j]
+            split = j+1
+        else:
+            # General beta: sample directly in log-space with the
+            # Gumbel-max trick. Adding -log(-log(U)) noise to each
+            # log-weight and taking the argmax draws a split with
+            # probability proportional to its weight, without any exp,
+            # normalization, or table construction; this also behaves
+            # well for strongly negative beta. The weights are
+            # symmetric in i <-> n_node-i, so the table lookup is
+            # shared by each pair of splits.
+            best  = -np.inf
+            split = 1
+            for i in range(1,n_node//2+1):
+                v = LG_beta[i]+LG_beta[n_node-i]-LG_fact[i]-LG_fact[n_node-i]
+                g = v-np.log(-np.log(rng.random()))
+                if g > best:
+                    best  = g
+                    split = i
+                if i != n_node-i:
+                    g = v-np.log(-np.log(rng.random()))
+                    if g > best:
+                        best  = g
+                        split = n_node-i
+        # Create children.
+        for new_n in (split,n_node-split):
+            if new_n == 1:
+                last_leaf_node += 1
+                parents[last_leaf_node] = node
+            else:
+                last_internal_node += 1
+                parents[last_internal_node] = node
+                sizes[last_internal_node]   = new_n
+                queue[top] = last_internal_node
+                top += 1
+    return last_internal_node
+
+
+#Work buffers shared by all simulateBetaSplitting calls in this
+#process, so generating many trees does not reallocate them per tree;
+#they are grown when a larger n comes along.
+_buffers = None
+
+def _getBuffers(n):
+    global _buffers
+    if _buffers==None or len(_buffers[0])<2*n+2:
+        _buffers = (np.zeros(2*n+2,dtype=np.int64),   #parents
+                    np.zeros(2*n+2,dtype=np.int64),   #sizes
+                    np.empty(n+1,dtype=np.int64),     #queue
+                    np.empty(n,dtype=np.float64),     #scratch
+                    np.empty(n,dtype=np.float64),     #prob
+                    np.empty(n,dtype=np.int64),       #alias
+                    np.empty(n,dtype=np.int64),       #small
+                    np.empty(n,dtype=np.int64))       #large
+    return _buffers
+
 
 # n: number of tips
 def simulateBetaSplitting(n, beta):
-    # Initialize tree.
-    tree = nx.DiGraph()
+    # Famous special cases get closed-form weights in the kernel.
+    special = 1 if beta==0 else (2 if beta==-1 else 0)
+    parents,sizes,queue,scratch,prob,alias,small,large = _getBuffers(n)
+    last_node = _simulateSplits(n, LG_beta, LG_fact, special, rng, parents, sizes, queue, scratch, prob, alias, small, large)
+    # All splits are sampled at this point; materialize the whole tree
+    # as a DiGraph in a single bulk call from the parents array.
+    children = np.flatnonzero(parents[:last_node+1])
+    tree = nx.from_edgelist(zip(parents[children].tolist(),children.tolist()),create_using=nx.DiGraph)
+    # The root has no parent; adding it explicitly covers n=1, where
+    # there are no edges at all.
     tree.add_node(n+1)
-    tree.node[n+1]['label'] = n
-    last_internal_node       = n+1
-    last_leaf_node           = 0 
-    queue                    = [n+1]
-    # Insert one node at each iteration.
-    while queue:
-        node        = queue.pop()
-        n_node      = tree.node[node].get('label')
-        # Internal node. Splits again.
-        if (n_node > 1): 
-            # Compute the "probability" to split n in (i|n-1), where i=1,..,n-1
-            q_n   = computeProb(n_node,beta)
-            split = random.choices(population=list(range(1,n_node)), weights=q_n, k=1)[0]
-            # Create children.
-            for new_n in [split,n_node-split]:
-                if new_n == 1:
-                    tree.add_edge(node,last_leaf_node+1)
-                    last_leaf_node+=1
-                else:
-                    tree.add_edge(node,last_internal_node+1)
-                    tree.node[last_internal_node+1]['label']=new_n
-                    queue.append(last_internal_node+1)
-                    last_internal_node+=1
     # Return tree.
     return tree
 
 
+############################################
+# Network data structure
+############################################
+
+#Struct-of-arrays store for the network while edges are being added.
+#Edges live in parallel arrays (src, dst, length, prob); per node the
+#outgoing and incoming edges form intrusive linked lists of edge
+#indices, so neighbor lookups walk contiguous int arrays instead of
+#networkx dicts-of-dicts. Removed edges are unlinked and tombstoned.
+#Lengths and probabilities are floats, with nan meaning `not set'.
+class ArrayNetwork:
+    def __init__(self,graph=None):
+        self.nbr_cache = {}
+        self.has_ranks = False
+        #set as soon as any edge gets a length or probability; plain
+        #networks never do, letting AddEdgeBetween skip all attribute
+        #handling
+        self.has_attributes = False
+        self.n_nodes = 0
+        self.n_edges = 0
+        self.n_alive = 0
+        node_cap     = 16
+        edge_cap     = 16
+        if graph!=None:
+            node_cap = max(node_cap,max(graph.nodes())+1)
+            edge_cap = max(edge_cap,graph.number_of_edges())
+        self.is_node   = np.zeros(node_cap,dtype=bool)
+        self.first_out = np.full(node_cap,-1,dtype=np.int64)
+        self.first_in  = np.full(node_cap,-1,dtype=np.int64)
+        self.rank      = np.zeros(node_cap,dtype=np.float64)
+        self.src       = np.empty(edge_cap,dtype=np.int64)
+        self.dst       = np.empty(edge_cap,dtype=np.int64)
+        self.length    = np.empty(edge_cap,dtype=np.float64)
+        self.prob      = np.empty(edge_cap,dtype=np.float64)
+        self.alive     = np.zeros(edge_cap,dtype=bool)
+        self.next_out  = np.empty(edge_cap,dtype=np.int64)
+        self.next_in   = np.empty(edge_cap,dtype=np.int64)
+        if graph!=None:
+            for v in graph.nodes():
+                self._ensure_node(v)
+            for u,v,data in graph.edges(data=True):
+                self.add_edge(u,v,length=data.get('length'),prob=data.get('prob'))
+
+    def _ensure_node(self,v):
+        if v>=len(self.is_node):
+            new_cap        = max(2*len(self.is_node),v+1)
+            self.is_node   = np.concatenate([self.is_node,np.zeros(new_cap-len(self.is_node),dtype=bool)])
+            self.first_out = np.concatenate([self.first_out,np.full(new_cap-len(self.first_out),-1,dtype=np.int64)])
+            self.first_in  = np.concatenate([self.first_in,np.full(new_cap-len(self.first_in),-1,dtype=np.int64)])
+            self.rank      = np.concatenate([self.rank,np.zeros(new_cap-len(self.rank),dtype=np.float64)])
+        self.is_node[v] = True
+        if v>=self.n_nodes:
+            self.n_nodes = v+1
+
+    #Allocate a fresh node id in O(1): n_nodes is one more than the
+    #highest id in use, so it acts as a running counter.
+    def new_node(self):
+        v = self.n_nodes
+        self._ensure_node(v)
+        return v
+
+    @property
+    def nodes(self):
+        return (int(v) for v in np.flatnonzero(self.is_node[:self.n_nodes]))
+
+    @property
+    def edges(self):
+        return ((int(self.src[e]),int(self.dst[e])) for e in range(self.n_edges) if self.alive[e])
+
+    def successors(self,u):
+        e = self.first_out[u]
+        while e!=-1:
+            yield int(self.dst[e])
+            e = self.next_out[e]
+
+    def predecessors(self,v):
+        e = self.first_in[v]
+        while e!=-1:
+            yield int(self.src[e])
+            e = self.next_in[e]
+
+    #Cached array of all neighbors (successors and predecessors) of u,
+    #used by the random walk in AddEdgeLocal. AddEdgeBetween drops the
+    #entries of the nodes whose adjacent edges it changes.
+    def neighbors(self,u):
+        nbrs = self.nbr_cache.get(u)
+        if nbrs is None:
+            nbrs = np.array(list(self.successors(u))+list(self.predecessors(u)),dtype=np.int64)
+            self.nbr_cache[u] = nbrs
+        return nbrs
+
+    def _find_edge(self,u,v):
+        e = self.first_out[u]
+        while e!=-1:
+            if self.dst[e]==v:
+                return e
+            e = self.next_out[e]
+        return -1
+
+    def has_edge(self,u,v):
+        return u<self.n_nodes and self._find_edge(u,v)!=-1
+
+    def add_edge(self,u,v,length=None,prob=None):
+        self._ensure_node(u)
+        self._ensure_node(v)
+        if self.n_edges==len(self.src):
+            #double the edge capacity
+            extra         = len(self.src)
+            self.src      = np.concatenate([self.src,np.empty(extra,dtype=np.int64)])
+            self.dst      = np.concatenate([self.dst,np.empty(extra,dtype=np.int64)])
+            self.length   = np.concatenate([self.length,np.empty(extra,dtype=np.float64)])
+            self.prob     = np.concatenate([self.prob,np.empty(extra,dtype=np.float64)])
+            self.alive    = np.concatenate([self.alive,np.zeros(extra,dtype=bool)])
+            self.next_out = np.concatenate([self.next_out,np.empty(extra,dtype=np.int64)])
+            self.next_in  = np.concatenate([self.next_in,np.empty(extra,dtype=np.int64)])
+        e = self.n_edges
+        self.src[e]    = u
+        self.dst[e]    = v
+        self.length[e] = np.nan if length==None else length
+        self.prob[e]   = np.nan if prob==None else prob
+        if length!=None or prob!=None:
+            self.has_attributes = True
+        self.alive[e]  = True
+        self.next_out[e]  = self.first_out[u]
+        self.first_out[u] = e
+        self.next_in[e]   = self.first_in[v]
+        self.first_in[v]  = e
+        self.n_edges  += 1
+        self.n_alive  += 1
+        return e
+
+    def add_edges_from(self,edge_list):
+        for u,v in edge_list:
+            self.add_edge(u,v)
+
+    def _unlink(self,first,nexts,head,e):
+        f = first[head]
+        if f==e:
+            first[head] = nexts[e]
+        else:
+            while nexts[f]!=e:
+                f = nexts[f]
+            nexts[f] = nexts[e]
+
+    def remove_edge(self,u,v):
+        e = self._find_edge(u,v)
+        self._unlink(self.first_out,self.next_out,u,e)
+        self._unlink(self.first_in,self.next_in,v,e)
+        self.alive[e]  = False
+        self.n_alive  -= 1
+
+    def remove_edges_from(self,edge_list):
+        for u,v in edge_list:
+            self.remove_edge(u,v)
+
+    #Pick an alive edge uniformly at random, by rejection over the edge
+    #slots; at least 3 of every 5 slots stay alive, so this is cheap.
+    def random_edge(self):
+        while True:
+            e = int(rng.integers(self.n_edges))
+            if self.alive[e]:
+                return (int(self.src[e]),int(self.dst[e]))
+
+    #Compute a topological rank for every node: ranks strictly increase
+    #along every arc, so a path from u to v implies rank[u]<rank[v].
+    #The ranks live in a plain float array indexed by node id.
+    def compute_ranks(self):
+        in_degree = np.zeros(self.n_nodes,dtype=np.int64)
+        for e in range(self.n_edges):
+            if self.alive[e]:
+                in_degree[self.dst[e]] += 1
+        stack = [v for v in self.nodes if in_degree[v]==0]
+        next_rank = 0
+        while stack:
+            v = stack.pop()
+            self.rank[v] = float(next_rank)
+            next_rank += 1
+            for w in self.successors(v):
+                in_degree[w] -= 1
+                if in_degree[w]==0:
+                    stack.append(w)
+        self.has_ranks = True
+
+    def edge_attributes(self,u,v):
+        e = self._find_edge(u,v)
+        return self.length[e],self.prob[e]
+
+    def set_length(self,u,v,value):
+        self.length[self._find_edge(u,v)] = value
+        self.has_attributes = True
+
+    def set_prob(self,u,v,value):
+        self.prob[self._find_edge(u,v)] = value
+        self.has_attributes = True
+
+    #Materialize the network as a networkx DiGraph (in one go, only
+    #needed if the result is used as a graph rather than printed).
+    def to_digraph(self):
+        graph = nx.DiGraph()
+        graph.add_nodes_from(self.nodes)
+        for e in range(self.n_edges):
+            if self.alive[e]:
+                graph.add_edge(int(self.src[e]),int(self.dst[e]))
+                if not np.isnan(self.length[e]):
+                    graph[int(self.src[e])][int(self.dst[e])]['length'] = self.length[e]
+                if not np.isnan(self.prob[e]):
+                    graph[int(self.src[e])][int(self.dst[e])]['prob'] = self.prob[e]
+        return graph
+
+
 def GenerateNetwork(tree,r,method):
-    network = tree.copy()
+    #convert the tree to the array representation for the edge additions
+    network = ArrayNetwork(tree)
+    # Topological rank per node, used by AddEdgeBetween to test
+    # reachability with a single compare instead of a path search.
+    network.compute_ranks()
     for i in range(r):
         if method==None:
             AddEdgeUniform(network)
@@ -132,43 +496,66 @@ def GenerateNetwork(tree,r,method):
 def AddEdgeBetween(network,edge1,edge2,new_nodes=None):
     #if we dont have new nodes yet, determine new nodes
     if new_nodes==None:
-        max_node = max(network.nodes())
-        new_nodes = (max_node+1,max_node+2)
-    #make sure edge2 is not above edge1
-    if nx.has_path(network,edge2[1],edge1[0]):
+        new_nodes = (network.new_node(),network.new_node())
+    if not network.has_ranks:
+        network.compute_ranks()
+    rank = network.rank
+    #make sure edge2 is not above edge1: a path from edge2[1] to
+    #edge1[0] requires rank[edge2[1]]<=rank[edge1[0]] (equal iff they
+    #are the same node), so this compare replaces nx.has_path
+    if rank[edge2[1]] <= rank[edge1[0]]:
         edge1,edge2=edge2,edge1
-    length1 = network[edge1[0]][edge1[1]].get('length')
-    prob1 = network[edge1[0]][edge1[1]].get('prob')    
-    length2 = network[edge2[0]][edge2[1]].get('length')
-    prob2 = network[edge2[0]][edge2[1]].get('prob')    
+    #only weighted networks need their edge attributes carried over
+    has_attributes = network.has_attributes
+    if has_attributes:
+        length1,prob1 = network.edge_attributes(edge1[0],edge1[1])
+        length2,prob2 = network.edge_attributes(edge2[0],edge2[1])
     #add an edge from edge1 to edge2
+    new_edges = [(edge1[0],new_nodes[0]),(new_nodes[0],edge1[1]),(edge2[0],new_nodes[1]),(new_nodes[1],edge2[1]),(new_nodes[0],new_nodes[1])]
     network.remove_edges_from([edge1,edge2])
-    network.add_edges_from([(edge1[0],new_nodes[0]),(new_nodes[0],edge1[1]),(edge2[0],new_nodes[1]),(new_nodes[1],edge2[1]),(new_nodes[0],new_nodes[1])])
-    
-    #If the original network had lengths and probabilities, add these to the subdivided arcs as well.
-    if length1!=None:
-        l11 = random.random()*length1
-        l12 = length1-l11
-        network[edge1[0]][new_nodes[0]]['length']=l11
-        network[new_nodes[0]][edge1[1]]['length']=l12
-    if prob1!=None:
-        network[new_nodes[0]][edge1[1]]['prob']=prob1
-    if length2!=None:
-        l21 = random.random()*length2
-        l22 = length2-l21
-        network[edge2[0]][new_nodes[1]]['length']=l21
-        network[new_nodes[1]][edge2[1]]['length']=l22
-    if prob2!=None:
-        network[new_nodes[1]][edge2[1]]['prob']=prob2
-    #TODO: add probabilities and length to the other new arcs as well?
+    network.add_edges_from(new_edges)
+    #invalidate the cached neighbor arrays of the touched nodes
+    for v in (edge1[0],edge1[1],edge2[0],edge2[1],new_nodes[0],new_nodes[1]):
+        network.nbr_cache.pop(v,None)
+    #rank the subdivision nodes inside their subdivided arcs, with the
+    #first below the second so the new arc respects the ranks as well
+    rank[new_nodes[0]] = (rank[edge1[0]]+min(rank[edge1[1]],rank[edge2[1]]))/2
+    rank[new_nodes[1]] = (max(rank[edge2[0]],rank[new_nodes[0]])+rank[edge2[1]])/2
+    #if the float midpoints degenerate (after very many subdivisions of
+    #the same arc), fall back to recomputing all ranks
+    if not (rank[edge1[0]]<rank[new_nodes[0]]<rank[edge1[1]] and rank[edge2[0]]<rank[new_nodes[1]]<rank[edge2[1]] and rank[new_nodes[0]]<rank[new_nodes[1]]):
+        network.compute_ranks()
+
+    #If the original network had lengths and probabilities, add these to
+    #the subdivided arcs as well. The trees generated by this script
+    #never set them, so the whole block is skipped for plain networks.
+    if has_attributes:
+        if not np.isnan(length1):
+            l11 = rng.random()*length1
+            l12 = length1-l11
+            network.set_length(edge1[0],new_nodes[0],l11)
+            network.set_length(new_nodes[0],edge1[1],l12)
+        if not np.isnan(prob1):
+            network.set_prob(new_nodes[0],edge1[1],prob1)
+        if not np.isnan(length2):
+            l21 = rng.random()*length2
+            l22 = length2-l21
+            network.set_length(edge2[0],new_nodes[1],l21)
+            network.set_length(new_nodes[1],edge2[1],l22)
+        if not np.isnan(prob2):
+            network.set_prob(new_nodes[1],edge2[1],prob2)
+        #TODO: add probabilities and length to the other new arcs as well?
+    return new_edges
+
 
-    
 
 #Pick two edges uniformly at random and add an edge between these
 def AddEdgeUniform(network,new_nodes=None):
-    edges = list(network.edges())
-    edge_indices = np.random.choice(range(len(edges)),2,replace=False)
-    AddEdgeBetween(network,edges[edge_indices[0]],edges[edge_indices[1]],new_nodes=new_nodes)
+    edge1 = network.random_edge()
+    edge2 = network.random_edge()
+    while edge2==edge1:
+        edge2 = network.random_edge()
+    AddEdgeBetween(network,edge1,edge2,new_nodes=new_nodes)
     
     
 #Pick one edge, move a random number of edges through the network to find a second edge
@@ -177,23 +564,27 @@ def AddEdgeLocal(network,new_nodes=None,stop_prob=0.2,max_steps=None,max_tries=N
     try_number = 1
     while max_tries==None or try_number<=max_tries:
         #Pick a random edge
-        edge1 = random.choice(list(network.edges()))
+        edge1 = network.random_edge()
         edge2 = None
         #Initiate the random walk, by choosing an orientation
-        previous_node = random.choice(edge1)
+        previous_node = edge1[int(rng.integers(2))]
         current_node  = edge1[0]
         if current_node == previous_node:
             current_node = edge1[1]
-        #Take a number of steps
-        step_number =1
-        while max_steps==None or step_number<=max_steps:
-            previous_node,current_node = current_node,random.choice(list(network.successors(current_node))+list(network.predecessors(current_node)))
-            if random.random()<stop_prob:
-                break
-            step_number+=1
+        #Take a number of steps. The walk length is geometric with
+        #parameter stop_prob, so sample it in one call and walk a
+        #counted loop instead of testing for a stop after every step.
+        steps = int(rng.geometric(stop_prob))
+        if max_steps!=None:
+            steps = min(steps,max_steps)
+        #draw all uniforms for this walk in one block; each one picks
+        #the next neighbor, so the loop itself makes no RNG calls
+        for u in rng.random(steps):
+            nbrs = network.neighbors(current_node)
+            previous_node,current_node = current_node,int(nbrs[int(u*len(nbrs))])
         #Set the new edge
         edge2 = (previous_node,current_node)
-        if edge2 not in network.edges():
+        if not network.has_edge(previous_node,current_node):
             edge2 = (current_node,previous_node)
         #Add an edge if possible, otherwise repeat the search
         if edge1!=edge2:
@@ -203,20 +594,16 @@ def AddEdgeLocal(network,new_nodes=None,stop_prob=0.2,max_steps=None,max_tries=N
 
 
 def OutputNetwork(network,out_type):
-    output = ""
+    #collect the lines in a list and join once, instead of growing one
+    #string by repeated concatenation
+    lines = []
     if out_type=="el":
-        for i,e in enumerate(network.edges):
-            if i!=0:
-                output+="\r\n"
-            output += str(e[0])+" "+str(e[1])
+        for e in network.edges:
+            lines.append(str(e[0])+" "+str(e[1]))
     elif out_type=="pl":
-        for i,v in enumerate(network.nodes):
-            if i!=0:
-                output+="\r\n"
-            output += str(v)
-            for p in network.predecessors(v):
-                output+=" "+str(p)
-    return output
+        for v in network.nodes:
+            lines.append(" ".join([str(v)]+[str(p) for p in network.predecessors(v)]))
+    return "\r\n".join(lines)
 
 
 
@@ -225,9 +612,31 @@ def OutputNetwork(network,out_type):
 # MAIN: Simulate network
 ############################################
 
-
-
-tree = simulateBetaSplitting(tree_size, beta)
-network = GenerateNetwork(tree,retics,local)
-print(OutputNetwork(network,out_type))
+#Simulate one network with the parameters parsed above. Passing a seed
+#replaces the generator, making the run reproducible; the parallel runs
+#below use it to make the workers independent.
+def SimulateNetwork(seed=None):
+    global rng
+    if seed!=None:
+        rng = np.random.default_rng(seed)
+    tree = simulateBetaSplitting(tree_size, beta)
+    return GenerateNetwork(tree,retics,local)
+
+
+#Simulate k independent networks, one job per core. The simulations
+#share no state, so this scales with the number of cores.
+def SimulateManyNetworks(k):
+    from joblib import Parallel, delayed
+    seeds = [int(s) for s in rng.integers(2**31,size=k)]
+    return Parallel(n_jobs=-1)(delayed(SimulateNetwork)(seed) for seed in seeds)
+
+
+if n_networks>1:
+    for i,network in enumerate(SimulateManyNetworks(n_networks)):
+        if i!=0:
+            print("")
+        print(OutputNetwork(network,out_type))
+else:
+    network = SimulateNetwork()
+    print(OutputNetwork(network,out_type))
 